@@ -0,0 +1,195 @@
+import json
+import time
+import queue
+import threading
+import subprocess
+import urllib.request
+from datetime import datetime
+
+# ================= 投递目标 =================
+# 每个 sink 只需实现 send(batch)，失败时抛异常即可，重试由 SinkWorker 负责
+
+
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, batch):
+        body = json.dumps({"alerts": batch}, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(
+            self.url, data=body, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+
+class JsonlSink:
+    name = "jsonl"
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, batch):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for a in batch:
+                f.write(json.dumps(a, ensure_ascii=False) + "\n")
+
+
+class CommandSink:
+    name = "command"
+
+    def __init__(self, cmd, timeout=30):
+        self.cmd = cmd
+        self.timeout = timeout
+
+    def send(self, batch):
+        # 告警以 JSON 数组写入命令的 stdin
+        subprocess.run(
+            self.cmd,
+            input=json.dumps(batch, ensure_ascii=False),
+            text=True,
+            shell=isinstance(self.cmd, str),
+            timeout=self.timeout,
+            check=True,
+        )
+
+
+# ================= 分发 =================
+class SinkWorker:
+    """每个 sink 独占一个线程：慢或挂起的 sink 只会拖慢自己，不影响其他 sink。"""
+
+    def __init__(self, sink, retries, backoff, max_backoff, on_error):
+        self.sink = sink
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_error = on_error
+        self.inbox = queue.Queue()
+        self.pending = []
+        self.attempts = 0
+        self.next_try = 0.0
+        self._thread = threading.Thread(
+            target=self._loop, name=f"alert-sink-{sink.name}", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, batch):
+        self.inbox.put(batch)
+
+    def close(self, timeout=None):
+        # None 作为结束标记：之前入队的批次会先被处理，然后再做最后一次投递
+        self.inbox.put(None)
+        self._thread.join(timeout)
+
+    def _loop(self):
+        while True:
+            timeout = max(0.0, self.next_try - time.time()) if self.pending else None
+            try:
+                batch = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                batch = []
+            final = batch is None
+            if batch:
+                self.pending.extend(batch)
+            if self.pending and (final or time.time() >= self.next_try):
+                self._send(final)
+            if final:
+                return
+
+    def _send(self, final=False):
+        # 最后一次投递之后不会再有重试机会，失败时同样要报告丢弃的告警
+        try:
+            self.sink.send(self.pending)
+        except Exception as e:
+            self.attempts += 1
+            if final or self.attempts > self.retries:
+                self.on_error(
+                    f"[ALERT] {self.sink.name} 投递失败 {self.attempts} 次，丢弃 {len(self.pending)} 条: {e!r}"
+                )
+            else:
+                self.next_try = time.time() + min(self.max_backoff, self.backoff ** self.attempts)
+                return
+        self.pending = []
+        self.attempts = 0
+        self.next_try = 0.0
+
+
+class AlertDispatcher:
+    """告警队列 + 后台投递线程：submit() 从不阻塞，投递按间隔批量进行。"""
+
+    def __init__(self, sinks, interval=10, retries=5, backoff=2.0,
+                 max_backoff=300, max_queue=10000, on_error=print):
+        self.sinks = sinks
+        self.interval = interval
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_error = on_error
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.workers = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, sid, reason):
+        try:
+            self.queue.put_nowait({
+                "sid": sid,
+                "reason": reason,
+                "ts": datetime.now().isoformat(timespec="seconds"),
+            })
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        if self._thread is None:
+            self.workers = [
+                SinkWorker(s, self.retries, self.backoff, self.max_backoff, self.on_error)
+                for s in self.sinks
+            ]
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="alert-dispatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        # 默认等待时间要覆盖最慢 sink 的超时，否则最后一次投递会随守护线程一起被截断
+        if timeout is None:
+            timeout = max((getattr(s, "timeout", 0) for s in self.sinks), default=0) + 5
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        deadline = time.time() + timeout
+        for w in self.workers:
+            w.close(max(0.0, deadline - time.time()))
+        self.workers = []
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def drain(self):
+        # 同一批次内相同 (sid, reason) 合并为一条并计数
+        merged = {}
+        while True:
+            try:
+                a = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            key = (a["sid"], a["reason"])
+            if key in merged:
+                merged[key]["count"] += 1
+            else:
+                merged[key] = dict(a, count=1)
+        return list(merged.values())
+
+    def flush(self):
+        batch = self.drain()
+        if batch:
+            for w in self.workers:
+                w.put(batch)
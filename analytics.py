@@ -0,0 +1,286 @@
+import os
+import sys
+import csv
+import json
+import argparse
+from array import array
+from collections import deque
+from datetime import date, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import logstore
+
+# ================= 默认参数（与 vf.py 保持一致） =================
+LOG_ROOT = "logs"
+CPU_HIGH = 90.0
+CPU_AVG_THRESHOLD = 50.0
+POLL_INTERVAL = 3
+
+# 相邻两次采样间隔超过该值视为采集中断：不计入时长，并打断"连续高负载"
+MAX_GAP = 900
+
+R1_SECONDS = 3600
+R2_SECONDS = 3600
+R3_WINDOW = 86400
+
+
+# ================= 分位数草图 =================
+class QuantileSketch:
+    """0~100% 按 0.1% 分桶的加权直方图：内存固定，可跨进程合并。"""
+
+    BINS = 1001
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self, counts=None):
+        self.counts = array("d", counts) if counts is not None else array("d", bytes(8 * self.BINS))
+        self.total = sum(self.counts)
+
+    def add(self, v, w=1.0):
+        i = int(round(v * 10))
+        self.counts[min(max(i, 0), self.BINS - 1)] += w
+        self.total += w
+
+    def merge(self, other):
+        for i, w in enumerate(other.counts):
+            self.counts[i] += w
+        self.total += other.total
+
+    def quantile(self, q):
+        if self.total <= 0:
+            return None
+        target = q * self.total
+        acc = 0.0
+        for i, w in enumerate(self.counts):
+            acc += w
+            if acc >= target:
+                return i / 10
+        return (self.BINS - 1) / 10
+
+
+# ================= 单服务器扫描（子进程） =================
+def fmt_ts(s):
+    return logstore.from_seconds(s).isoformat(timespec="seconds") if s is not None else ""
+
+
+def analyze_server(root, sid, since, until, opts):
+    path = os.path.join(root, sid)
+    sketch = QuantileSketch()
+    samples = 0
+    first = last = None
+    vmax = None
+    weighted = 0.0
+
+    r1_acc = 0.0
+    r2_since = None
+    r3_buckets = deque()  # (minute, sum, count)，只保留最近 24h
+    r3_sum = 0.0
+    r3_count = 0
+    hits = {"R1": None, "R2": None, "R3": None}
+
+    high_w = 0.0
+    approx = False
+
+    prev = None
+    for d in logstore.list_dates(path):
+        if not since <= d <= until:
+            continue
+        # 聚合日每行是一分钟的均值：按 count 还原采样数，按 peak 判断峰值，
+        # 按 highs（该分钟内 >= 阈值的采样数）还原高负载时长和 R1/R2。
+        # 旧版聚合文件或阈值与聚合时不同则只能按分钟均值判定，结果标记为近似。
+        # 分位数只能基于分钟均值计算，这是聚合本身的精度损失。
+        series, peaks, counts, highs, rolled_high = logstore.read_day_detail(path, d)
+        exact = highs is not None and rolled_high == opts["cpu_high"]
+        if counts is not None and not exact:
+            approx = True
+        for i, (t, v) in enumerate(zip(series.ts, series.values)):
+            t, v = float(t), float(v)
+            peak = float(peaks[i])
+            n = float(counts[i]) if counts is not None else 1
+            if exact:
+                n_high = float(highs[i])
+            else:
+                n_high = n if v >= opts["cpu_high"] else 0.0
+            gap = opts["poll_interval"] * n if prev is None else t - prev
+            prev = t
+            w = gap if gap <= opts["max_gap"] else 0.0
+            if first is None:
+                first = t
+            last = t
+            samples += int(n)
+            vmax = peak if vmax is None else max(vmax, peak)
+            weighted += v * w
+            sketch.add(v, w)
+            high_w += w * n_high / n
+
+            # R1 / R2 与 vf.py 的判定方式一致：R1 每个命中的采样累计一个轮询间隔，
+            # R2 要求整分钟的采样都命中
+            if n_high:
+                r1_acc += opts["poll_interval"] * n_high
+                if hits["R1"] is None and r1_acc >= R1_SECONDS:
+                    hits["R1"] = t
+            if n_high == n:
+                if r2_since is None or gap > opts["max_gap"]:
+                    r2_since = t
+                if hits["R2"] is None and t - r2_since >= R2_SECONDS:
+                    hits["R2"] = t
+            else:
+                r2_since = None
+
+            # R3 滚动 24h 平均，按分钟聚合保证内存有界
+            minute = int(t // 60)
+            if r3_buckets and r3_buckets[-1][0] == minute:
+                m, s, c = r3_buckets[-1]
+                r3_buckets[-1] = (m, s + v * n, c + n)
+            else:
+                r3_buckets.append((minute, v * n, n))
+            r3_sum += v * n
+            r3_count += n
+            while r3_buckets and (minute - r3_buckets[0][0]) * 60 >= R3_WINDOW:
+                _, s, c = r3_buckets.popleft()
+                r3_sum -= s
+                r3_count -= c
+            if hits["R3"] is None and r3_count and r3_sum / r3_count >= opts["avg_threshold"]:
+                hits["R3"] = t
+
+    if not samples:
+        return None
+    return {
+        "sid": sid,
+        "first": fmt_ts(first),
+        "last": fmt_ts(last),
+        "samples": samples,
+        "hours": round(sketch.total / 3600, 2),
+        "avg": round(weighted / sketch.total, 2) if sketch.total else None,
+        "max": vmax,
+        "p50": sketch.quantile(0.50),
+        "p95": sketch.quantile(0.95),
+        "p99": sketch.quantile(0.99),
+        "hours_high": round(high_w / 3600, 2),
+        "hours_high_approx": approx,
+        "r1": fmt_ts(hits["R1"]),
+        "r2": fmt_ts(hits["R2"]),
+        "r3": fmt_ts(hits["R3"]),
+        "sketch": list(sketch.counts),
+    }
+
+
+# ================= 汇总 / 导出 =================
+FIELDS = [
+    "sid", "first", "last", "samples", "hours", "avg", "max",
+    "p50", "p95", "p99", "hours_high", "hours_high_approx", "r1", "r2", "r3",
+]
+
+
+def fleet_summary(rows):
+    fleet = QuantileSketch()
+    for r in rows:
+        fleet.merge(QuantileSketch(r["sketch"]))
+    return {
+        "servers": len(rows),
+        "hours": round(fleet.total / 3600, 2),
+        "p50": fleet.quantile(0.50),
+        "p95": fleet.quantile(0.95),
+        "p99": fleet.quantile(0.99),
+        "hours_high": round(sum(r["hours_high"] for r in rows), 2),
+        "hours_high_approx": any(r["hours_high_approx"] for r in rows),
+        "r1": sum(1 for r in rows if r["r1"]),
+        "r2": sum(1 for r in rows if r["r2"]),
+        "r3": sum(1 for r in rows if r["r3"]),
+    }
+
+
+def write_csv(fn, rows):
+    with open(fn, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(rows)
+
+
+def write_json(fn, rows, fleet):
+    servers = [{k: r[k] for k in FIELDS} for r in rows]
+    with open(fn, "w", encoding="utf-8") as f:
+        json.dump({"fleet": fleet, "servers": servers}, f, ensure_ascii=False, indent=2)
+
+
+def print_report(rows, fleet, top):
+    print(
+        f"[FLEET] servers={fleet['servers']} hours={fleet['hours']} "
+        f"p50={fleet['p50']} p95={fleet['p95']} p99={fleet['p99']} "
+        f"hours_high={fleet['hours_high']}{'~' if fleet['hours_high_approx'] else ''} "
+        f"R1={fleet['r1']} R2={fleet['r2']} R3={fleet['r3']}"
+    )
+    print(f"[TOP{top}] by p95:")
+    for r in sorted(rows, key=lambda r: r["p95"], reverse=True)[:top]:
+        rules = ",".join(k.upper() for k in ("r1", "r2", "r3") if r[k]) or "-"
+        print(
+            f"  SID={r['sid']} p50={r['p50']}% p95={r['p95']}% p99={r['p99']}% "
+            f"high={r['hours_high']}h{'~' if r['hours_high_approx'] else ''} rules={rules}"
+        )
+    if fleet["hours_high_approx"]:
+        print("  ~ 部分日期为旧版聚合或阈值与聚合时不同，高负载时长按分钟均值估算")
+
+
+# ================= 主入口 =================
+def parse_args(argv):
+    ap = argparse.ArgumentParser(description="离线统计 LOG_ROOT 下的 CPU 历史")
+    ap.add_argument("--root", default=LOG_ROOT)
+    ap.add_argument("--days", type=int, default=30, help="统计最近 N 天（含今天）")
+    ap.add_argument("--since", help="起始日期 YYYY-MM-DD，优先于 --days")
+    ap.add_argument("--until", help="结束日期 YYYY-MM-DD，默认今天")
+    ap.add_argument("--servers", nargs="*", help="只统计这些 SID")
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--cpu-high", type=float, default=CPU_HIGH)
+    ap.add_argument("--avg-threshold", type=float, default=CPU_AVG_THRESHOLD)
+    ap.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    ap.add_argument("--max-gap", type=float, default=MAX_GAP)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--csv", help="导出每台服务器的统计到 CSV")
+    ap.add_argument("--json", help="导出集群 + 每台服务器的统计到 JSON")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    until = args.until or date.today().isoformat()
+    since = args.since or (date.fromisoformat(until) - timedelta(days=args.days - 1)).isoformat()
+    opts = {
+        "cpu_high": args.cpu_high,
+        "avg_threshold": args.avg_threshold,
+        "poll_interval": args.poll_interval,
+        "max_gap": args.max_gap,
+    }
+
+    if not os.path.isdir(args.root):
+        print(f"[!] 日志目录不存在: {args.root}")
+        return 1
+    sids = args.servers or sorted(
+        d for d in os.listdir(args.root) if os.path.isdir(os.path.join(args.root, d))
+    )
+
+    print(f"[*] 扫描 {len(sids)} 台服务器 {since} ~ {until}")
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(analyze_server, args.root, sid, since, until, opts) for sid in sids]
+        for fut in futures:
+            r = fut.result()
+            if r is not None:
+                rows.append(r)
+
+    if not rows:
+        print("[!] 区间内没有数据")
+        return 1
+
+    fleet = fleet_summary(rows)
+    print_report(rows, fleet, args.top)
+    if args.csv:
+        write_csv(args.csv, rows)
+        print(f"[+] CSV 已写入 {args.csv}")
+    if args.json:
+        write_json(args.json, rows, fleet)
+        print(f"[+] JSON 已写入 {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import os
+import math
+import time
+import struct
+from multiprocessing import shared_memory
+
+# ================= 共享内存布局 =================
+# vf.py 写入每台服务器的最新采样，viewer.py 只读订阅；scraper 不在运行时由 viewer 回退到日志文件。
+#
+# header: magic, capacity, count, seq, heartbeat, pid
+#   seq 为顺序锁：写入前 +1（奇数），写完再 +1（偶数）；读者读到奇数或前后不一致就重读
+# slot:   sid, ts, cpu, avg_5min, avg_24h（无数据为 NaN），sid 为空表示空闲槽位
+
+FEED_NAME = "vf_monitor_live"
+MAGIC = b"VFLIVE01"
+
+HEADER = struct.Struct("<8sIIQdI4x")
+SLOT = struct.Struct("<16sdddd")
+
+# 心跳超过该秒数未更新即视为 scraper 已停止
+STALE_AFTER = 60
+
+
+def feed_size(capacity):
+    return HEADER.size + capacity * SLOT.size
+
+
+def nan_if_none(v):
+    return math.nan if v is None else v
+
+
+def none_if_nan(v):
+    return None if math.isnan(v) else v
+
+
+def pid_alive(pid):
+    # Windows 上 os.kill(pid, 0) 会直接结束目标进程，只能打开句柄查询退出码
+    if pid <= 0 or pid == os.getpid():
+        return False
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        h = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not h:
+            return ctypes.get_last_error() == 5  # ERROR_ACCESS_DENIED：进程存在但无权限
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(h, ctypes.byref(code))) and code.value == 259
+        finally:
+            kernel32.CloseHandle(h)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# ================= 写端（vf.py） =================
+class LiveFeedWriter:
+    def __init__(self, name=FEED_NAME, capacity=4096):
+        size = feed_size(capacity)
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # 同名段仍有心跳且写入进程还活着，说明另一个 vf.py 正在写入，拒绝接管；
+            # 否则是上次退出的遗留（Windows 上 viewer 挂着映射时段不会消失）：够大就复用，不够大则重建
+            self.shm = attach(name)
+            magic, _, _, _, heartbeat, pid = HEADER.unpack_from(self.shm.buf, 0)
+            if magic == MAGIC and time.time() - heartbeat <= STALE_AFTER and pid_alive(pid):
+                self.shm.close()
+                self.shm = None
+                raise FileExistsError(f"共享内存 {name} 正被 pid={pid} 使用")
+            if self.shm.size < size:
+                self.shm.close()
+                self.shm.unlink()
+                self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.buf = self.shm.buf
+        self.capacity = capacity
+        self.count = 0
+        self.seq = 0
+        self.slots = {}
+        self.free = []
+        self.buf[:size] = bytes(size)
+        self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(
+            self.buf, 0, MAGIC, self.capacity, self.count, self.seq, time.time(), os.getpid()
+        )
+
+    def _begin(self):
+        self.seq += 1
+        struct.pack_into("<Q", self.buf, 16, self.seq)
+
+    def _end(self):
+        self.seq += 1
+        self._write_header()
+
+    def publish(self, sid, ts, cpu, avg_5min=None, avg_24h=None):
+        key = sid.encode("ascii", "ignore")
+        if len(key) > 16:
+            return
+        idx = self.slots.get(sid)
+        if idx is None:
+            if self.free:
+                idx = self.free.pop()
+            elif self.count < self.capacity:
+                idx = self.count
+                self.count += 1
+            else:
+                return
+            self.slots[sid] = idx
+        self._begin()
+        SLOT.pack_into(
+            self.buf, HEADER.size + idx * SLOT.size,
+            key, ts, cpu, nan_if_none(avg_5min), nan_if_none(avg_24h),
+        )
+        self._end()
+
+    def remove(self, sid):
+        idx = self.slots.pop(sid, None)
+        if idx is None:
+            return
+        self._begin()
+        off = HEADER.size + idx * SLOT.size
+        self.buf[off:off + SLOT.size] = bytes(SLOT.size)
+        self._end()
+        self.free.append(idx)
+
+    def heartbeat(self):
+        self._begin()
+        self._end()
+
+    def close(self):
+        # 先清掉 magic 和心跳：段若因 viewer 仍挂着而留存，读者立即回退到日志，下一个 vf.py 也可直接接管
+        self.buf[:HEADER.size] = bytes(HEADER.size)
+        self.buf = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ================= 读端（viewer.py） =================
+def attach(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        pass
+    shm = shared_memory.SharedMemory(name)
+    if os.name == "posix":
+        # Python 3.13 之前只读挂载也会被 resource_tracker 登记，退出时会把 scraper 的段删掉
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class LiveFeedReader:
+    def __init__(self, name=FEED_NAME, stale_after=STALE_AFTER):
+        self.name = name
+        self.stale_after = stale_after
+        self.shm = None
+
+    def _detach(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+    def _read_consistent(self):
+        buf = self.shm.buf
+        for _ in range(10):
+            header = HEADER.unpack_from(buf, 0)
+            magic, capacity, count, seq = header[:4]
+            if magic != MAGIC:
+                return None
+            if seq % 2:
+                time.sleep(0.001)
+                continue
+            data = bytes(buf[:HEADER.size + count * SLOT.size])
+            if HEADER.unpack_from(buf, 0)[3] == seq:
+                return HEADER.unpack_from(data, 0), data
+        return None
+
+    def snapshot(self):
+        """返回 {sid: {ts, cpu, avg_5min, avg_24h}}；scraper 未运行或心跳过期时返回 None。"""
+        if self.shm is None:
+            try:
+                self.shm = attach(self.name)
+            except (FileNotFoundError, OSError, ValueError):
+                return None
+
+        got = self._read_consistent()
+        if got is None:
+            return None
+        (_, _, count, _, heartbeat, _), data = got
+        if time.time() - heartbeat > self.stale_after:
+            # 重新挂载，scraper 重启后可能已换成新的段
+            self._detach()
+            return None
+
+        out = {}
+        for i in range(count):
+            key, ts, cpu, avg_5min, avg_24h = SLOT.unpack_from(data, HEADER.size + i * SLOT.size)
+            sid = key.rstrip(b"\0").decode("ascii")
+            if sid:
+                out[sid] = {
+                    "ts": ts,
+                    "cpu": cpu,
+                    "avg_5min": none_if_nan(avg_5min),
+                    "avg_24h": none_if_nan(avg_24h),
+                }
+        return out
+
+    def close(self):
+        self._detach()
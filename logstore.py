@@ -0,0 +1,491 @@
+import io
+import os
+import gzip
+import time
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date, timedelta
+from math import fsum
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ================= 文件布局 =================
+# logs/<sid>/YYYY-MM-DD.log              当天原始采样，由 vf.py 追加写入
+# logs/<sid>/YYYY-MM-DD.log.gz|.zst      已结束日期的压缩原始采样
+# logs/<sid>/YYYY-MM-DD.1m.log.gz|.zst   超过聚合天数后的分钟聚合: ts avg min max count highs
+#   首行 "# cpu_high=<阈值>"，highs 为该分钟内 >= 阈值的采样数；旧版聚合文件没有首行和 highs 列
+
+RAW_SUFFIXES = (".log", ".log.gz", ".log.zst")
+ROLLUP_SUFFIXES = (".1m.log.gz", ".1m.log.zst")
+
+# 同一日期存在多种形态时（例如压缩中途退出），按此顺序优先读取
+DAY_SUFFIXES = RAW_SUFFIXES + ROLLUP_SUFFIXES
+
+# 当天文件最后一次写入后至少静置这么久才会被压缩，避免和跨零点的写入冲突
+COMPACT_GRACE = 600
+
+# 聚合时统计 highs 所用的阈值，与 vf.py 的 CPU_HIGH 一致
+ROLLUP_CPU_HIGH = 90.0
+
+
+# ================= 文件名 =================
+def split_name(fn):
+    d, suffix = fn[:10], fn[10:]
+    if suffix not in DAY_SUFFIXES:
+        return None
+    try:
+        date.fromisoformat(d)
+    except ValueError:
+        return None
+    return d, suffix
+
+
+def day_files(path):
+    days = {}
+    if not os.path.isdir(path):
+        return days
+    for fn in os.listdir(path):
+        parsed = split_name(fn)
+        if parsed:
+            days.setdefault(parsed[0], []).append(parsed[1])
+    for suffixes in days.values():
+        suffixes.sort(key=DAY_SUFFIXES.index)
+    return days
+
+
+def list_dates(path):
+    return sorted(day_files(path))
+
+
+def resolve_ext(compression):
+    if compression == "zst" and zstandard is not None:
+        return ".zst"
+    return ".gz"
+
+
+# ================= 解析 =================
+# 时间戳统一表示为"本地墙钟秒"：把日志里的 naive 本地时间当作 UTC 换算成自 1970-01-01 起的秒数。
+# 不经过时区换算，便于按固定 ISO 布局直接解析，也能和 datetime.now() 直接比较。
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+
+def to_seconds(dt):
+    return (
+        (dt.toordinal() - EPOCH_ORDINAL) * 86400
+        + dt.hour * 3600 + dt.minute * 60 + dt.second
+        + dt.microsecond / 1e6
+    )
+
+
+def from_seconds(s):
+    return EPOCH + timedelta(seconds=s)
+
+
+# isoformat() 只会写出这两种长度：不带微秒 19 位，带微秒 26 位
+STAMP_LENGTHS = {19, 26}
+
+
+def parse_stamps(stamps):
+    # datetime.fromisoformat 是 C 实现，比在 Python 里切片拼秒数更快
+    fromiso = datetime.fromisoformat
+    return array("d", [(fromiso(s) - EPOCH).total_seconds() for s in stamps])
+
+
+def parse_bulk(tokens, ncols):
+    stamps = tokens[0::ncols]
+    if np is not None:
+        ts = np.array(stamps, dtype="datetime64[us]")
+        ts = (ts - np.datetime64("1970-01-01")) / np.timedelta64(1, "s")
+        return Series(ts, np.array(tokens[1::ncols], dtype=float)).sorted()
+    # 纯 Python：只校验长度（C 层完成），数值立即解析，时间戳等到真正用到时再解析
+    if not set(map(len, stamps)) <= STAMP_LENGTHS:
+        raise ValueError("malformed timestamp")
+    return Series(None, array("d", map(float, tokens[1::ncols])), stamps)
+
+
+def parse_lines(text, ncols):
+    # 兜底路径：逐行解析，跳过写了一半或格式错误的行
+    ts, values = array("d"), array("d")
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) != ncols:
+            continue
+        try:
+            t = to_seconds(datetime.fromisoformat(parts[0]))
+            v = float(parts[1])
+        except ValueError:
+            continue
+        ts.append(t)
+        values.append(v)
+    return Series(ts, values).sorted()
+
+
+def trim_tokens(tokens, ncols, start, end):
+    # 日志按追加顺序写入，固定布局的 ISO 时间戳字典序即时间序：
+    # 直接在字符串上二分裁掉区间外的行，只解析需要的部分
+    stamps = tokens[0::ncols]
+    lo = 0 if start is None else bisect_left(stamps, start.isoformat())
+    hi = len(stamps) if end is None else bisect_right(stamps, end.isoformat())
+    return tokens[lo * ncols:hi * ncols]
+
+
+def parse_text(text, ncols=2, start=None, end=None):
+    tokens = text.split()
+    if not tokens:
+        return Series.empty()
+    if len(tokens) % ncols == 0:
+        if np is None and (start is not None or end is not None):
+            tokens = trim_tokens(tokens, ncols, start, end)
+        try:
+            return parse_bulk(tokens, ncols).slice(start, end)
+        except ValueError:
+            pass
+    return parse_lines(text, ncols).slice(start, end)
+
+
+# ================= 序列 =================
+class Series:
+    """按时间排序的 (时间戳, 数值) 列存序列，底层为 numpy 数组或 array('d')。
+
+    纯 Python 路径下时间戳先保留原始字符串，第一次访问 ts 时才解析；
+    只需要数值的调用（例如求均值）因此不必付出解析时间戳的开销。
+    """
+
+    __slots__ = ("_ts", "values", "stamps")
+
+    def __init__(self, ts, values, stamps=None):
+        if np is not None and ts is not None:
+            ts = np.asarray(ts, dtype=float)
+            values = np.asarray(values, dtype=float)
+        self._ts = ts
+        self.values = values
+        self.stamps = stamps
+
+    @property
+    def ts(self):
+        if self._ts is None:
+            self._ts = parse_stamps(self.stamps)
+            self.stamps = None
+        return self._ts
+
+    @classmethod
+    def empty(cls):
+        return cls(array("d"), array("d"))
+
+    @classmethod
+    def concat(cls, parts):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        if np is not None:
+            return cls(
+                np.concatenate([p.ts for p in parts]),
+                np.concatenate([p.values for p in parts]),
+            ).sorted()
+        values = array("d")
+        for p in parts:
+            values.extend(p.values)
+        if all(p.stamps is not None for p in parts):
+            return cls(None, values, [s for p in parts for s in p.stamps])
+        ts = array("d")
+        for p in parts:
+            ts.extend(p.ts)
+        return cls(ts, values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        for t, v in zip(self.ts, self.values):
+            yield from_seconds(t), v
+
+    def sorted(self):
+        # numpy 下检查有序是向量化的，顺便处理系统时间回拨；纯 Python 路径按追加顺序视为有序
+        if np is None or len(self._ts) < 2 or not (np.diff(self._ts) < 0).any():
+            return self
+        order = np.argsort(self._ts, kind="stable")
+        return Series(self._ts[order], self.values[order])
+
+    def slice(self, start=None, end=None):
+        if self.stamps is not None:
+            lo = 0 if start is None else bisect_left(self.stamps, start.isoformat())
+            hi = len(self.stamps) if end is None else bisect_right(self.stamps, end.isoformat())
+            return Series(None, self.values[lo:hi], self.stamps[lo:hi])
+        if isinstance(start, datetime):
+            start = to_seconds(start)
+        if isinstance(end, datetime):
+            end = to_seconds(end)
+        if np is not None:
+            lo = 0 if start is None else int(np.searchsorted(self.ts, start, "left"))
+            hi = len(self.ts) if end is None else int(np.searchsorted(self.ts, end, "right"))
+        else:
+            lo = 0 if start is None else bisect_left(self.ts, start)
+            hi = len(self.ts) if end is None else bisect_right(self.ts, end)
+        return Series(self.ts[lo:hi], self.values[lo:hi])
+
+    def last(self):
+        return float(self.values[-1])
+
+    def min(self):
+        if np is not None:
+            return float(self.values.min())
+        return min(self.values)
+
+    def max(self):
+        if np is not None:
+            return float(self.values.max())
+        return max(self.values)
+
+    def mean(self):
+        if np is not None:
+            return float(self.values.mean())
+        return fsum(self.values) / len(self.values)
+
+
+# ================= 读取 =================
+def open_text(fn):
+    if fn.endswith(".gz"):
+        return gzip.open(fn, "rt", encoding="utf-8")
+    if fn.endswith(".zst"):
+        if zstandard is None:
+            raise OSError(f"zstandard 未安装，无法读取 {fn}")
+        raw = open(fn, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), encoding="utf-8")
+    return open(fn, "r", encoding="utf-8")
+
+
+def read_text(fn, strict=False):
+    # 读者遇到坏文件按空处理；整理时必须 strict，否则损坏的源文件会被当成空数据覆盖掉。
+    # 文件不存在总是抛出，由 read_day_text 重新解析后缀
+    try:
+        with open_text(fn) as f:
+            return f.read()
+    except FileNotFoundError:
+        raise
+    except (OSError, EOFError, UnicodeDecodeError):
+        if strict:
+            raise
+        return ""
+
+
+def parse_day(text, fn, start=None, end=None):
+    # 聚合文件新旧两种列数都要认，统一交给 parse_rollup；前两列与原始格式一致
+    if fn.endswith(ROLLUP_SUFFIXES):
+        return parse_rollup(text)[0].slice(start, end)
+    return parse_text(text, 2, start, end)
+
+
+def read_file(fn, start=None, end=None, strict=False):
+    return parse_day(read_text(fn, strict), fn, start, end)
+
+
+def read_day_text(path, date_str, suffix):
+    # 整理线程可能在 day_files() 与打开文件之间把 X.log 换成 X.log.gz，
+    # 文件消失时重新解析该日期的后缀再读一次，而不是把这一天当成没有数据
+    try:
+        return suffix, read_text(os.path.join(path, date_str + suffix))
+    except FileNotFoundError:
+        pass
+    suffixes = day_files(path).get(date_str)
+    if not suffixes:
+        return suffix, ""
+    suffix = suffixes[0]
+    try:
+        return suffix, read_text(os.path.join(path, date_str + suffix))
+    except FileNotFoundError:
+        return suffix, ""
+
+
+def read_day(path, date_str):
+    suffixes = day_files(path).get(date_str)
+    if not suffixes:
+        return Series.empty()
+    suffix, text = read_day_text(path, date_str, suffixes[0])
+    return parse_day(text, suffix)
+
+
+def parse_rollup(text):
+    """返回 (Series, peaks, counts, highs, cpu_high)；旧版聚合文件的 highs 与 cpu_high 为 None。"""
+    # 每分钟一行，一天至多 1440 行，逐行解析即可；写入时已按时间排序
+    ts, values, peaks, counts, highs = array("d"), array("d"), array("d"), array("d"), array("d")
+    cpu_high = None
+    for line in text.splitlines():
+        if line.startswith("# cpu_high="):
+            try:
+                cpu_high = float(line[len("# cpu_high="):])
+            except ValueError:
+                pass
+            continue
+        parts = line.split()
+        if len(parts) not in (5, 6):
+            continue
+        try:
+            t = to_seconds(datetime.fromisoformat(parts[0]))
+            v, hi, n = float(parts[1]), float(parts[3]), float(parts[4])
+            h = float(parts[5]) if len(parts) == 6 else None
+        except ValueError:
+            continue
+        ts.append(t)
+        values.append(v)
+        peaks.append(hi)
+        counts.append(n)
+        if h is not None:
+            highs.append(h)
+    if cpu_high is None or len(highs) != len(counts):
+        highs = None
+        cpu_high = None
+    return Series(ts, values), peaks, counts, highs, cpu_high
+
+
+def read_day_detail(path, date_str):
+    """返回 (Series, peaks, counts, highs, cpu_high)。聚合文件的每行代表 counts 个采样、
+    最大值为 peaks、其中 highs 个 >= cpu_high；原始文件每行就是一个采样，peaks 即 values，
+    其余为 None。"""
+    suffixes = day_files(path).get(date_str)
+    if not suffixes:
+        return Series.empty(), array("d"), None, None, None
+    suffix, text = read_day_text(path, date_str, suffixes[0])
+    if suffix in ROLLUP_SUFFIXES:
+        return parse_rollup(text)
+    series = parse_text(text, 2)
+    return series, series.values, None, None, None
+
+
+def read_range(path, start, end=None):
+    end = end or datetime.now()
+    first, last = start.date().isoformat(), end.date().isoformat()
+    parts = []
+    for d, suffixes in sorted(day_files(path).items()):
+        if first <= d <= last:
+            suffix, text = read_day_text(path, d, suffixes[0])
+            parts.append(parse_day(text, suffix, start, end))
+    return Series.concat(parts)
+
+
+# ================= 写入 =================
+def open_write(fn):
+    if fn.endswith(".zst"):
+        raw = open(fn, "wb")
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw), encoding="utf-8")
+    return gzip.open(fn, "wt", encoding="utf-8")
+
+
+def write_atomic(fn, lines):
+    tmp = fn + ".tmp"
+    with open_write(tmp) as f:
+        f.writelines(lines)
+    os.replace(tmp, fn)
+
+
+def rollup_lines(series, cpu_high=ROLLUP_CPU_HIGH):
+    # 额外记下每分钟 >= cpu_high 的采样数，聚合后仍能按采样统计高负载时长
+    buckets = {}
+    for t, v in zip(series.ts, series.values):
+        key = int(t // 60) * 60
+        high = 1 if v >= cpu_high else 0
+        b = buckets.get(key)
+        if b is None:
+            buckets[key] = [v, v, v, 1, high]
+        else:
+            b[0] += v
+            b[1] = min(b[1], v)
+            b[2] = max(b[2], v)
+            b[3] += 1
+            b[4] += high
+    return [f"# cpu_high={cpu_high}\n"] + [
+        f"{from_seconds(key).isoformat()} {s / n:.2f} {lo} {hi} {n} {h}\n"
+        for key, (s, lo, hi, n, h) in sorted(buckets.items())
+    ]
+
+
+# ================= 压缩 / 聚合 / 清理 =================
+def compact_day(path, d, suffixes, age, ext, rollup_days, retention_days,
+                cpu_high=ROLLUP_CPU_HIGH):
+    files = [os.path.join(path, d + s) for s in suffixes]
+
+    if age >= retention_days:
+        for fn in files:
+            os.remove(fn)
+        return
+
+    if age >= rollup_days:
+        if suffixes[0] in ROLLUP_SUFFIXES:
+            keep = files[0]
+        else:
+            keep = os.path.join(path, d + ".1m.log" + ext)
+            write_atomic(keep, rollup_lines(read_file(files[0], strict=True), cpu_high))
+    elif suffixes[0] == ".log":
+        if time.time() - os.path.getmtime(files[0]) < COMPACT_GRACE:
+            return
+        keep = os.path.join(path, d + ".log" + ext)
+        with open(files[0], "r", encoding="utf-8") as f:
+            write_atomic(keep, f)
+    else:
+        keep = files[0]
+
+    for fn in files:
+        if fn != keep:
+            os.remove(fn)
+
+
+def remove_stale_tmp(path):
+    # 整理是单线程进行的，进入目录时残留的 .tmp 只可能来自上次被中断的写入
+    for fn in os.listdir(path):
+        if fn.endswith(".tmp") and split_name(fn[:-4]):
+            os.remove(os.path.join(path, fn))
+
+
+def compact_server(path, today, ext, rollup_days, retention_days, on_error=print,
+                   cpu_high=ROLLUP_CPU_HIGH):
+    # 单个文件出错（损坏、被 viewer 占用等）只跳过该日期，不影响其余日期和服务器
+    try:
+        remove_stale_tmp(path)
+    except OSError as e:
+        on_error(f"[COMPACT] {path} 清理临时文件失败: {e!r}")
+    for d, suffixes in day_files(path).items():
+        age = (today - date.fromisoformat(d)).days
+        if age < 1:
+            continue
+        try:
+            compact_day(path, d, suffixes, age, ext, rollup_days, retention_days, cpu_high)
+        except Exception as e:
+            on_error(f"[COMPACT] {path} {d} 整理失败: {e!r}")
+
+
+def compact(root, compression="gz", rollup_days=7, retention_days=90, on_error=print,
+            cpu_high=ROLLUP_CPU_HIGH):
+    if not os.path.isdir(root):
+        return
+    today = date.today()
+    ext = resolve_ext(compression)
+    for sid in os.listdir(root):
+        path = os.path.join(root, sid)
+        if os.path.isdir(path):
+            compact_server(path, today, ext, rollup_days, retention_days, on_error, cpu_high)
+
+
+def start_compactor(root, interval=3600, on_error=print, **kwargs):
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            try:
+                compact(root, on_error=on_error, **kwargs)
+            except Exception as e:
+                on_error(f"[COMPACT] 日志整理失败: {e!r}")
+            stop.wait(interval)
+
+    threading.Thread(target=loop, name="log-compactor", daemon=True).start()
+    return stop
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 各模块是仓库根目录下的独立脚本，测试直接按模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,119 @@
+import json
+import time
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import alerts
+
+
+@pytest.fixture
+def webhook():
+    # 本地 HTTP 替身：前两次返回 500，之后接受并记录请求体
+    state = {"fail": 2, "calls": 0, "received": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            state["calls"] += 1
+            if state["fail"] > 0:
+                state["fail"] -= 1
+                self.send_response(500)
+            else:
+                state["received"].append(json.loads(body))
+                self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    srv = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{srv.server_port}/"
+    yield state
+    srv.shutdown()
+    srv.server_close()
+
+
+def wait_for(cond, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def read_jsonl(path):
+    if not path.exists():
+        return []
+    return [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_webhook_retry_dedup_and_jsonl(webhook, tmp_path):
+    jsonl = tmp_path / "alerts.jsonl"
+    d = alerts.AlertDispatcher(
+        [alerts.WebhookSink(webhook["url"], timeout=2), alerts.JsonlSink(str(jsonl))],
+        interval=0.1,
+        backoff=1.1,
+    ).start()
+    try:
+        for _ in range(3):
+            d.submit("1", "R1")
+        d.submit("2", "R3")
+
+        assert wait_for(lambda: webhook["received"])
+    finally:
+        d.stop()
+
+    assert webhook["calls"] == 3
+    batch = webhook["received"][0]["alerts"]
+    assert {(a["sid"], a["reason"], a["count"]) for a in batch} == {("1", "R1", 3), ("2", "R3", 1)}
+    assert [(a["sid"], a["count"]) for a in read_jsonl(jsonl)] == [("1", 3), ("2", 1)]
+
+
+def test_slow_sink_does_not_delay_jsonl(tmp_path):
+    class SlowSink:
+        name = "slow"
+        timeout = 1
+
+        def send(self, batch):
+            time.sleep(3)
+
+    jsonl = tmp_path / "alerts.jsonl"
+    d = alerts.AlertDispatcher([SlowSink(), alerts.JsonlSink(str(jsonl))], interval=0.1).start()
+    try:
+        d.submit("1", "R2")
+        t0 = time.time()
+        assert wait_for(lambda: read_jsonl(jsonl), timeout=2)
+        assert time.time() - t0 < 1.5
+    finally:
+        d.stop(timeout=0.5)
+
+
+def test_submit_never_blocks_when_queue_full():
+    d = alerts.AlertDispatcher([], max_queue=1)
+    d.submit("1", "R1")
+    t0 = time.time()
+    d.submit("2", "R1")
+    assert time.time() - t0 < 0.1
+    assert d.dropped == 1
+
+
+def test_final_flush_failure_is_reported():
+    class BrokenSink:
+        name = "broken"
+        timeout = 1
+
+        def send(self, batch):
+            raise OSError("down")
+
+    errors = []
+    d = alerts.AlertDispatcher([BrokenSink()], interval=60, on_error=errors.append).start()
+    d.submit("1", "R1")
+    d.submit("2", "R2")
+    d.stop()
+
+    assert len(errors) == 1
+    assert "broken" in errors[0] and "丢弃 2 条" in errors[0]
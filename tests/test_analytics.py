@@ -0,0 +1,88 @@
+import os
+import gzip
+import datetime as dt
+
+import analytics
+import logstore
+
+OPTS = {"cpu_high": 90.0, "avg_threshold": 50.0, "poll_interval": 3, "max_gap": 900}
+
+
+def steady(i):
+    # 恒定 95%，每分钟第一个采样冲到 99%
+    return 99.0 if i % 60 == 0 else 95.0
+
+
+def spiky(i):
+    # 平时 10%，每分钟只有第一个采样冲到 95%
+    return 95.0 if i % 60 == 0 else 10.0
+
+
+def write_day(root, sid, d, load=steady):
+    # 整天每 3 秒一个采样
+    path = os.path.join(root, sid)
+    os.makedirs(path, exist_ok=True)
+    fn = os.path.join(path, f"{d}.log")
+    t = dt.datetime.combine(d, dt.time(0))
+    with open(fn, "w", encoding="utf-8") as f:
+        for i in range(0, 86400, 3):
+            f.write(f"{(t + dt.timedelta(seconds=i)).isoformat()} {load(i)}\n")
+    os.utime(fn, (0, 0))
+
+
+def test_rollup_replay_matches_raw(tmp_path):
+    d = dt.date.today() - dt.timedelta(days=10)
+    raw, roll = str(tmp_path / "raw"), str(tmp_path / "roll")
+    write_day(raw, "1", d)
+    write_day(roll, "1", d)
+    logstore.compact(raw, rollup_days=30)
+    logstore.compact(roll, rollup_days=7)
+    assert os.listdir(os.path.join(roll, "1")) == [f"{d}.1m.log.gz"]
+
+    a = analytics.analyze_server(raw, "1", str(d), str(d), OPTS)
+    b = analytics.analyze_server(roll, "1", str(d), str(d), OPTS)
+
+    assert a["samples"] == b["samples"] == 28800
+    assert a["max"] == b["max"] == 99.0
+    assert a["hours_high"] == b["hours_high"] == 24.0
+    assert a["r1"] == f"{d}T00:59:57"
+    assert b["r1"] == f"{d}T00:59:00"
+    assert a["r2"] == b["r2"]
+    assert not a["hours_high_approx"] and not b["hours_high_approx"]
+
+
+def test_spiky_rollup_matches_raw(tmp_path):
+    d = dt.date.today() - dt.timedelta(days=10)
+    raw, roll = str(tmp_path / "raw"), str(tmp_path / "roll")
+    write_day(raw, "1", d, spiky)
+    write_day(roll, "1", d, spiky)
+    logstore.compact(raw, rollup_days=30)
+    logstore.compact(roll, rollup_days=7)
+
+    a = analytics.analyze_server(raw, "1", str(d), str(d), OPTS)
+    b = analytics.analyze_server(roll, "1", str(d), str(d), OPTS)
+
+    # 每分钟 20 个采样只有 1 个高负载：24h * 1/20
+    assert a["hours_high"] == b["hours_high"] == 1.2
+    assert not b["hours_high_approx"]
+    assert a["r1"] == f"{d}T19:59:00"
+    assert b["r1"] == f"{d}T19:59:00"
+    assert a["r2"] == b["r2"] == ""
+
+    # 阈值与聚合时不同：只能按分钟均值判定，并标记为近似
+    c = analytics.analyze_server(roll, "1", str(d), str(d), dict(OPTS, cpu_high=50.0))
+    assert c["hours_high"] == 0.0 and c["hours_high_approx"]
+
+
+def test_legacy_rollup_is_approx(tmp_path):
+    d = dt.date.today() - dt.timedelta(days=10)
+    path = tmp_path / "1"
+    path.mkdir()
+    t = dt.datetime.combine(d, dt.time(0))
+    with gzip.open(path / f"{d}.1m.log.gz", "wt", encoding="utf-8") as f:
+        for m in range(60):
+            f.write(f"{(t + dt.timedelta(minutes=m)).isoformat()} 95.00 90.0 99.0 20\n")
+
+    r = analytics.analyze_server(str(tmp_path), "1", str(d), str(d), OPTS)
+    assert r["samples"] == 1200
+    assert r["hours_high"] == 1.0 and r["hours_high_approx"]
@@ -0,0 +1,62 @@
+import os
+import struct
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+import livefeed
+
+
+@pytest.fixture
+def name():
+    return f"vf_test_{uuid.uuid4().hex[:8]}"
+
+
+def set_pid(writer, pid):
+    # header 末尾的 pid 字段
+    struct.pack_into("<I", writer.buf, livefeed.HEADER.size - 8, pid)
+
+
+def abandon(writer):
+    # 模拟进程退出但段仍被别人挂着：不清 header、不 unlink
+    writer.buf = None
+    writer.shm.close()
+
+
+def test_close_clears_header(name):
+    w = livefeed.LiveFeedWriter(name, capacity=4)
+    w.publish("1", 0.0, 50.0)
+    held = livefeed.attach(name)
+    try:
+        w.close()
+        magic, _, _, _, heartbeat, _ = livefeed.HEADER.unpack_from(held.buf, 0)
+        assert magic != livefeed.MAGIC and heartbeat == 0
+    finally:
+        held.close()
+
+
+def test_segment_of_dead_writer_is_taken_over(name):
+    proc = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                          capture_output=True, text=True, check=True)
+    old = livefeed.LiveFeedWriter(name, capacity=4)
+    set_pid(old, int(proc.stdout))
+    abandon(old)
+
+    w = livefeed.LiveFeedWriter(name, capacity=4)
+    try:
+        w.publish("1", 0.0, 50.0)
+        assert set(livefeed.LiveFeedReader(name).snapshot()) == {"1"}
+    finally:
+        w.close()
+
+
+def test_segment_of_live_writer_is_refused(name):
+    old = livefeed.LiveFeedWriter(name, capacity=4)
+    set_pid(old, os.getppid())
+    try:
+        with pytest.raises(FileExistsError):
+            livefeed.LiveFeedWriter(name, capacity=4)
+    finally:
+        old.close()
@@ -0,0 +1,98 @@
+import os
+import datetime as dt
+
+import pytest
+
+import logstore
+
+
+def write_log(path, d, rows):
+    os.makedirs(path, exist_ok=True)
+    fn = os.path.join(path, f"{d}.log")
+    with open(fn, "w", encoding="utf-8") as f:
+        for t, v in rows:
+            f.write(f"{t.isoformat()} {v}\n")
+    return fn
+
+
+def test_read_range_survives_concurrent_compression(tmp_path, monkeypatch):
+    # 模拟整理线程在 day_files() 之后、打开文件之前把 X.log 换成了 X.log.gz
+    path = str(tmp_path / "1")
+    now = dt.datetime.now()
+    y = (now - dt.timedelta(days=1)).date()
+    fn = write_log(path, y, [(dt.datetime.combine(y, dt.time(23, 59)), 80.0)])
+    logstore.write_atomic(fn + ".gz", open(fn, encoding="utf-8"))
+
+    stale = {y.isoformat(): [".log", ".log.gz"]}
+    real = logstore.day_files
+    calls = []
+
+    def day_files(p):
+        calls.append(p)
+        if len(calls) == 1:
+            os.remove(fn)
+            return stale
+        return real(p)
+
+    monkeypatch.setattr(logstore, "day_files", day_files)
+    data = logstore.read_range(path, dt.datetime.combine(y, dt.time(0)))
+    assert list(data.values) == [80.0]
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    # 同一组用例分别跑纯 Python 路径和 numpy 路径；未安装 numpy 时跳过后者
+    if request.param == "numpy":
+        monkeypatch.setattr(logstore, "np", pytest.importorskip("numpy"))
+    else:
+        monkeypatch.setattr(logstore, "np", None)
+    return request.param
+
+
+BASE = dt.datetime(2026, 1, 2, 12, 0)
+ROWS = [(BASE + dt.timedelta(seconds=3 * i, microseconds=250000 * (i % 2)), float(i)) for i in range(10)]
+TEXT = "".join(f"{t.isoformat()} {v}\n" for t, v in ROWS)
+
+
+def test_bulk_parse(backend):
+    s = logstore.parse_text(TEXT)
+    assert list(s.values) == [v for _, v in ROWS]
+    assert list(s.ts) == pytest.approx([logstore.to_seconds(t) for t, _ in ROWS])
+    assert [t for t, _ in s] == [t for t, _ in ROWS]
+    assert (s.min(), s.max(), s.last(), s.mean()) == (0.0, 9.0, 9.0, 4.5)
+
+
+def test_malformed_and_half_written_lines_are_skipped(backend):
+    text = (
+        TEXT
+        + "garbage 1.0\n"
+        + f"{BASE.isoformat()} not-a-number\n"
+        + BASE.isoformat()[:15] + ROWS[0][0].isoformat() + " 5.0\n"
+        + ROWS[0][0].isoformat()[:12]
+    )
+    s = logstore.parse_text(text)
+    assert list(s.values) == [v for _, v in ROWS]
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (None, None, list(range(10))),
+    (ROWS[2][0], ROWS[5][0], [2, 3, 4, 5]),
+    (ROWS[2][0] + dt.timedelta(microseconds=1), None, list(range(3, 10))),
+    (None, ROWS[5][0] - dt.timedelta(microseconds=1), list(range(5))),
+    (BASE - dt.timedelta(days=1), BASE + dt.timedelta(days=1), list(range(10))),
+    (BASE + dt.timedelta(hours=1), None, []),
+])
+def test_range_bounds(backend, start, end, expected):
+    s = logstore.parse_text(TEXT, 2, start, end)
+    assert list(s.values) == [float(v) for v in expected]
+    full = logstore.parse_text(TEXT)
+    assert list(full.slice(start, end).values) == [float(v) for v in expected]
+
+
+def test_rollup_columns_and_concat(backend):
+    rollup = "".join(f"{t.isoformat()} {v} {v} {v} 20\n" for t, v in ROWS[:3])
+    a = logstore.parse_text(rollup, 5)
+    b = logstore.parse_text(TEXT, 2, ROWS[5][0])
+    s = logstore.Series.concat([a, b])
+    assert list(s.values) == [0.0, 1.0, 2.0, 5.0, 6.0, 7.0, 8.0, 9.0]
+    assert list(s.slice(ROWS[1][0], ROWS[6][0]).values) == [1.0, 2.0, 5.0, 6.0]
@@ -1,11 +1,15 @@
 import os
 import sys
 import time
+from array import array
 from datetime import datetime, timedelta
-from collections import deque, defaultdict
 
 from playwright.sync_api import sync_playwright
 
+import alerts
+import livefeed
+import logstore
+
 # ================= 参数 =================
 
 # 这里写 Virtfusion 面板访问地址 仅在 Virtfusion 6.2.0 测试通过
@@ -35,18 +39,86 @@ WATCHDOG_TIMEOUT = 120
 
 CPU_5MIN_WINDOW = 300
 
+# 从 Active 列表消失的服务器，状态保留这么久后清除
+STATE_EVICT_GRACE = 86400
+
+# 通过共享内存把最新采样实时推送给 viewer.py
+LIVE_FEED = True
+LIVE_FEED_CAPACITY = 4096
+# 共享内存创建失败（例如上一个实例的段还没释放）后隔多久重试
+LIVE_FEED_RETRY = 30
+
+# 日志整理：已结束的日期压缩（gz，或安装 zstandard 后用 zst），
+# 超过 LOG_ROLLUP_DAYS 天聚合为分钟粒度，超过 LOG_RETENTION_DAYS 天删除
+LOG_COMPRESSION = "gz"
+LOG_ROLLUP_DAYS = 7
+LOG_RETENTION_DAYS = 90
+LOG_COMPACT_INTERVAL = 3600
+
+# 告警投递：按间隔批量发送，失败指数退避重试；JSONL 文件始终写入，
+# webhook / 命令通过环境变量开启（命令从 stdin 读取 JSON 数组）
+ALERT_BATCH_INTERVAL = 10
+ALERT_RETRIES = 5
+ALERT_JSONL = "alerts.jsonl"
+ALERT_WEBHOOK_URL = os.environ.get("VF_ALERT_WEBHOOK")
+ALERT_COMMAND = os.environ.get("VF_ALERT_COMMAND")
+
 # ================= Watchdog =================
 class WatchdogRestart(Exception):
     pass
 
 # ================= 状态 =================
-cpu_90_accumulate = {}
-cpu_90_continuous = {}
-alerted = set()
+class ServerState:
+    # 每台服务器一条记录；5 分钟窗口用定长环形缓冲，容量按最短采样间隔算出
+    __slots__ = (
+        "ts", "cpu", "head", "size",
+        "high_accumulate", "high_since", "alerted", "last_seen",
+    )
 
-cpu_5min_samples = defaultdict(deque)
+    CAPACITY = CPU_5MIN_WINDOW // POLL_INTERVAL + 1
+
+    def __init__(self, now):
+        self.ts = array("d", bytes(8 * self.CAPACITY))
+        self.cpu = array("d", bytes(8 * self.CAPACITY))
+        self.head = 0
+        self.size = 0
+        self.high_accumulate = 0
+        self.high_since = None
+        self.alerted = False
+        self.last_seen = now
+
+    def push(self, ts, cpu):
+        cap = self.CAPACITY
+        if self.size == cap:
+            self.head = (self.head + 1) % cap
+            self.size -= 1
+        i = (self.head + self.size) % cap
+        self.ts[i] = ts
+        self.cpu[i] = cpu
+        self.size += 1
+        self.expire(ts)
+        self.last_seen = ts
+
+    def expire(self, now):
+        cap = self.CAPACITY
+        while self.size and now - self.ts[self.head] > CPU_5MIN_WINDOW:
+            self.head = (self.head + 1) % cap
+            self.size -= 1
+
+    def avg(self):
+        # 按当前时间淘汰，已停止采样的服务器不会带着冻结的均值留在 Top5 里
+        self.expire(time.time())
+        if not self.size:
+            return None
+        cap = self.CAPACITY
+        return sum(self.cpu[(self.head + k) % cap] for k in range(self.size)) / self.size
+
+server_states = {}
 last_5min_report = 0
 
+live_feed = None
+live_feed_next_try = 0.0
+
 last_success_ts = time.time()
 
 # 进度条状态
@@ -127,27 +199,49 @@ def read_last_24h_avg(sid):
     path = os.path.join(LOG_ROOT, sid)
     if not os.path.exists(path):
         return None
-    cutoff = datetime.now() - timedelta(hours=24)
-    total = count = 0
-    for fn in os.listdir(path):
-        if not fn.endswith(".log"):
-            continue
-        with open(os.path.join(path, fn), encoding="utf-8") as f:
-            for line in f:
-                try:
-                    ts, cpu = line.split()
-                    if datetime.fromisoformat(ts) >= cutoff:
-                        total += float(cpu)
-                        count += 1
-                except:
-                    pass
-    return total / count if count else None
+    data = logstore.read_range(path, datetime.now() - timedelta(hours=24))
+    return data.mean() if data else None
+
+def build_alert_dispatcher():
+    sinks = [alerts.JsonlSink(ALERT_JSONL)]
+    if ALERT_WEBHOOK_URL:
+        sinks.append(alerts.WebhookSink(ALERT_WEBHOOK_URL))
+    if ALERT_COMMAND:
+        sinks.append(alerts.CommandSink(ALERT_COMMAND))
+    return alerts.AlertDispatcher(
+        sinks,
+        interval=ALERT_BATCH_INTERVAL,
+        retries=ALERT_RETRIES,
+        on_error=ui_print,
+    )
+
+alert_dispatcher = build_alert_dispatcher()
+
+def get_state(sid):
+    st = server_states.get(sid)
+    if st is None:
+        st = server_states[sid] = ServerState(time.time())
+    return st
+
+def evict_states(active_ids):
+    now = time.time()
+    active = set(active_ids)
+    for sid, st in list(server_states.items()):
+        if sid in active:
+            st.last_seen = max(st.last_seen, now)
+        elif now - st.last_seen > STATE_EVICT_GRACE:
+            del server_states[sid]
+            if live_feed:
+                live_feed.remove(sid)
 
 def alert(sid, reason):
-    if sid in alerted:
+    st = get_state(sid)
+    if st.alerted:
         return
-    alerted.add(sid)
+    st.alerted = True
     ui_print(f"[ALERT] SID={sid} 命中规则: {reason}")
+    # 只入队，投递在后台线程完成，扫描循环不等待网络
+    alert_dispatcher.submit(sid, reason)
 
 # ================= 登录 =================
 def auto_login(page):
@@ -220,6 +314,7 @@ def run_once(pw):
 
     auto_login(page)
     ids = get_all_server_ids(page)
+    evict_states(ids)
     last_refresh = time.time()
 
     ui_print("[*] 开始监控")
@@ -233,6 +328,7 @@ def run_once(pw):
 
         if now - last_refresh > SERVER_REFRESH_INTERVAL:
             ids = get_all_server_ids(page)
+            evict_states(ids)
             last_refresh = now
 
         progress_done = 0
@@ -260,11 +356,8 @@ def run_once(pw):
 
                 log_cpu(sid, cpu)
 
-                now_ts = time.time()
-                dq = cpu_5min_samples[sid]
-                dq.append((now_ts, cpu))
-                while dq and now_ts - dq[0][0] > CPU_5MIN_WINDOW:
-                    dq.popleft()
+                st = get_state(sid)
+                st.push(time.time(), cpu)
 
                 if DEBUG_LEVEL >= 1:
                     msg = f"[CPU] SID={sid} now={cpu:.1f}%"
@@ -274,33 +367,38 @@ def run_once(pw):
                     ui_print(msg)
 
                 if cpu >= CPU_HIGH:
-                    cpu_90_accumulate[sid] = cpu_90_accumulate.get(sid, 0) + POLL_INTERVAL
-                    if cpu_90_accumulate[sid] >= 3600:
+                    st.high_accumulate += POLL_INTERVAL
+                    if st.high_accumulate >= 3600:
                         alert(sid, "R1(累计90%≥1h)")
-                    cpu_90_continuous.setdefault(sid, now)
-                    if now - cpu_90_continuous[sid] >= 3600:
+                    if st.high_since is None:
+                        st.high_since = now
+                    if now - st.high_since >= 3600:
                         alert(sid, "R2(连续90%≥1h)")
                 else:
-                    cpu_90_continuous.pop(sid, None)
+                    st.high_since = None
 
                 avg = read_last_24h_avg(sid)
                 if avg is not None and avg >= CPU_AVG_THRESHOLD:
                     alert(sid, "R3(24h平均≥50%)")
 
+                if live_feed:
+                    live_feed.publish(sid, time.time(), cpu, st.avg(), avg)
+
         # ===== 每 5 分钟 Top5 =====
         if time.time() - last_5min_report >= 300:
             last_5min_report = time.time()
             lines = ["[STATS][Last Scan] Top5 CPU:"]
             stats = []
-            for sid, dq in cpu_5min_samples.items():
-                if dq:
-                    stats.append((sum(v for _, v in dq) / len(dq), sid))
+            for sid, st in server_states.items():
+                avg = st.avg()
+                if avg is not None:
+                    stats.append((avg, sid))
             for avg, sid in sorted(stats, reverse=True)[:5]:
                 lines.append(f"  SID={sid} high={avg:.1f}%")
 
             lines.append("[STATS][24h] Top5 CPU:")
             stats = []
-            for sid in cpu_5min_samples:
+            for sid in server_states:
                 avg = read_last_24h_avg(sid)
                 if avg is not None:
                     stats.append((avg, sid))
@@ -310,17 +408,52 @@ def run_once(pw):
             lines.append("-" * 40)
             ui_print_lines(lines)
 
+        open_live_feed()
+        if live_feed:
+            live_feed.heartbeat()
         time.sleep(POLL_INTERVAL)
 
 # ================= 主入口 =================
+def open_live_feed():
+    # watchdog 重启很快，上一个实例的段可能还被占着：失败不放弃，隔 LIVE_FEED_RETRY 秒再试
+    global live_feed, live_feed_next_try
+    if not LIVE_FEED or live_feed is not None or time.time() < live_feed_next_try:
+        return
+    try:
+        live_feed = livefeed.LiveFeedWriter(capacity=LIVE_FEED_CAPACITY)
+    except OSError as e:
+        if not live_feed_next_try:
+            ui_print(f"[LIVE] 共享内存不可用，viewer 暂时只读取日志，{LIVE_FEED_RETRY}s 后重试: {e!r}")
+        live_feed_next_try = time.time() + LIVE_FEED_RETRY
+        return
+    if live_feed_next_try:
+        ui_print("[LIVE] 共享内存已就绪")
+
+
 def main():
     ensure_dir(LOG_ROOT)
-    with sync_playwright() as pw:
-        while True:
-            try:
-                run_once(pw)
-            except WatchdogRestart:
-                ui_print("[WATCHDOG] 重启浏览器")
+    open_live_feed()
+    logstore.start_compactor(
+        LOG_ROOT,
+        interval=LOG_COMPACT_INTERVAL,
+        on_error=ui_print,
+        compression=LOG_COMPRESSION,
+        rollup_days=LOG_ROLLUP_DAYS,
+        retention_days=LOG_RETENTION_DAYS,
+        cpu_high=CPU_HIGH,
+    )
+    alert_dispatcher.start()
+    try:
+        with sync_playwright() as pw:
+            while True:
+                try:
+                    run_once(pw)
+                except WatchdogRestart:
+                    ui_print("[WATCHDOG] 重启浏览器")
+    finally:
+        alert_dispatcher.stop()
+        if live_feed:
+            live_feed.close()
 
 if __name__ == "__main__":
     main()
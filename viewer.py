@@ -2,13 +2,16 @@ import os
 import sys
 import re
 import math
+import time
 import datetime
-from statistics import mean
 from urllib.parse import urlparse
 
 import requests
 from qtpy import QtWidgets, QtCore, QtGui
 
+import livefeed
+import logstore
+
 # =========================
 # 基础设置 & 工具
 # =========================
@@ -81,42 +84,18 @@ class LogManager:
 
     @staticmethod
     def dates(server_id):
-        p = os.path.join(LogManager.BASE, server_id)
-        if not os.path.isdir(p):
-            return []
-        return sorted(f[:-4] for f in os.listdir(p) if f.endswith(".log"))
+        return logstore.list_dates(os.path.join(LogManager.BASE, server_id))
 
     @staticmethod
     def read(server_id, date_str):
-        path = os.path.join(LogManager.BASE, server_id, f"{date_str}.log")
-        if not os.path.isfile(path):
-            return []
-
-        out = []
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    ts, val = line.split()
-                    out.append((datetime.datetime.fromisoformat(ts), float(val)))
-                except Exception:
-                    pass
-        return out
+        # 原始 / 压缩 / 分钟聚合文件均由 logstore 统一读取
+        return logstore.read_day(os.path.join(LogManager.BASE, server_id), date_str)
 
     @staticmethod
     def read_last_24h(server_id):
         now = datetime.datetime.now()
-        today = now.date()
-        yesterday = today - datetime.timedelta(days=1)
-
-        data = []
-        for d in (yesterday, today):
-            data.extend(LogManager.read(server_id, d.isoformat()))
-
         cutoff = now - datetime.timedelta(hours=24, minutes=5)
-        return [(t, v) for t, v in data if t >= cutoff and t <= now]
+        return logstore.read_range(os.path.join(LogManager.BASE, server_id), cutoff, now)
 
 
 # =========================
@@ -211,12 +190,22 @@ class ServerCard(QtWidgets.QFrame):
             self.gauge.set_value(0)
             return
 
-        values = [v for _, v in data]
-        self.gauge.set_value(values[-1])
+        self.gauge.set_value(data.last())
         self.stats.setText(
-            f"Max {max(values):.1f}%\n"
-            f"Min {min(values):.1f}%\n"
-            f"Avg {mean(values):.1f}%"
+            f"Max {data.max():.1f}%\n"
+            f"Min {data.min():.1f}%\n"
+            f"Avg {data.mean():.1f}%"
+        )
+
+    def set_live(self, rec):
+        def fmt(v):
+            return f"{v:.1f}%" if v is not None else "N/A"
+
+        self.gauge.set_value(rec["cpu"])
+        self.stats.setText(
+            f"Now {fmt(rec['cpu'])}\n"
+            f"5m Avg {fmt(rec['avg_5min'])}\n"
+            f"24h Avg {fmt(rec['avg_24h'])}"
         )
 
 
@@ -225,6 +214,10 @@ class ServerCard(QtWidgets.QFrame):
 # =========================
 
 class ServerPage(QtWidgets.QScrollArea):
+    # 有 vf.py 共享内存时每秒刷新；没有时回退到日志文件，降低频率避免反复解析
+    LIVE_INTERVAL_MS = 1000
+    LOG_INTERVAL = 30
+
     def __init__(self, settings):
         super().__init__()
         self.settings = settings
@@ -235,14 +228,38 @@ class ServerPage(QtWidgets.QScrollArea):
         self.grid = QtWidgets.QGridLayout(self.container)
         self.cards = {}
 
+        self.feed = livefeed.LiveFeedReader()
+        self.last_log_refresh = time.monotonic()
+
         self.load()
 
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(self.LIVE_INTERVAL_MS)
+
+    def add_card(self, sid):
+        i = len(self.cards)
+        card = ServerCard(sid, self.settings)
+        self.cards[sid] = card
+        self.grid.addWidget(card, i // 2, i % 2)
+        return card
+
     def load(self):
-        servers = LogManager.servers()
-        for i, sid in enumerate(servers):
-            card = ServerCard(sid, self.settings)
-            self.cards[sid] = card
-            self.grid.addWidget(card, i // 2, i % 2)
+        for sid in LogManager.servers():
+            self.add_card(sid)
+
+    def tick(self):
+        live = self.feed.snapshot() or {}
+        for sid, rec in live.items():
+            card = self.cards.get(sid) or self.add_card(sid)
+            card.set_live(rec)
+
+        # 不在实时数据里的服务器（scraper 未运行，或已下线只剩日志）按较低频率从日志刷新
+        if time.monotonic() - self.last_log_refresh >= self.LOG_INTERVAL:
+            self.last_log_refresh = time.monotonic()
+            for sid, card in self.cards.items():
+                if sid not in live:
+                    card.refresh()
 
 
 # =========================
@@ -325,22 +342,20 @@ class HistoryPage(QtWidgets.QWidget):
             self.info.setText("No data")
             return
 
-        values = [v for _, v in data]
         text = (
             f"[Today] "
-            f"Max {max(values):.1f}%  "
-            f"Min {min(values):.1f}%  "
-            f"Avg {mean(values):.1f}%"
+            f"Max {data.max():.1f}%  "
+            f"Min {data.min():.1f}%  "
+            f"Avg {data.mean():.1f}%"
         )
 
         data24 = LogManager.read_last_24h(sid)
         if data24:
-            v24 = [v for _, v in data24]
             text += (
                 f"\n[24h] "
-                f"Max {max(v24):.1f}%  "
-                f"Min {min(v24):.1f}%  "
-                f"Avg {mean(v24):.1f}%"
+                f"Max {data24.max():.1f}%  "
+                f"Min {data24.min():.1f}%  "
+                f"Avg {data24.mean():.1f}%"
             )
 
         self.info.setText(text)